@@ -5,4 +5,5 @@ setup(
     package_dir={'': 'src'},
     packages=['say'],
     version='0.2.1',
+    extras_require={'fast': ['orjson']},
 )
@@ -1,21 +1,82 @@
 import typing as ty
-import argparse
+import types
+import enum
+import contextlib
 import os
 import re
 import subprocess
 import json
+import sys
 from pathlib import Path
-import shutil
-import shlex
 import logging
-import threading
-import queue
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MODEL_PATTERN = re.compile(
+    r'^[ \t]*\d+: *(tts_models/[-/\w]+)( *\[already downloaded])?', re.M)
+
+# Matches the quoted speaker names in the repr of ``dict_keys``; names that
+# contain a single quote are quoted with double quotes by ``repr``.
+SPEAKER_PATTERN = re.compile(r'([\'"])(.*?)\1')
+
+# Datasets of ``tts_models`` that contain only one speaker.
+SINGLE_SPEAKER_DATASETS = frozenset([
+    'baker',
+    'blizzard2013',
+    'css10',
+    'ek1',
+    'jsut',
+    'kokoro',
+    'ljspeech',
+    'mai',
+    'mai_female',
+    'mai_male',
+    'openbible',
+    'sam',
+    'thorsten',
+])
+
+# Number of seconds before the cached model list expires.
+MODELS_CACHE_TTL = 24 * 60 * 60
+
+# Default number of seconds to wait for tts-server, overridden by variable
+# ``tts_server_timeout``.
+TTS_SERVER_TIMEOUT = 120
+
+
+def json_dumps(obj) -> bytes:
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def json_loads(data: bytes):
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def emit(resp):
+    """
+    Write the Alfred response ``resp`` to stdout, bypassing the text layer.
+    """
+    sys.stdout.buffer.write(json_dumps(resp))
 
 
 def make_parser():
+    import argparse
+
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(dest='func')
-    subparsers.add_parser('list-models', help='list available models')
+    parser_list_models = subparsers.add_parser(
+        'list-models', help='list available models')
+    parser_list_models.add_argument(
+        '--force-refresh',
+        action='store_true',
+        help='ignore the cached model list')
     subparsers.add_parser('list-speakers', help='list availabel speakers')
     subparsers.add_parser('save-cfg', help='save config to disk')
     subparsers.add_parser('check-cfg', help='check current config')
@@ -26,6 +87,21 @@ def make_parser():
     return parser
 
 
+def write_atomic(path: Path, data: bytes):
+    """
+    Write ``data`` to ``path`` such that readers never see a partially
+    written file, even if several actions write it at the same time.
+    """
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'wb') as outfile:
+            outfile.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
 def get_host() -> ty.Optional[str]:
     """
     :return: the host address where ``TTS`` is installed, or ``None`` if
@@ -63,8 +139,15 @@ def get_device() -> ty.Optional[str]:
     return device
 
 
+def is_debugging() -> bool:
+    """
+    :return: ``True`` if Alfred debug panel is open
+    """
+    return 'alfred_debug' in os.environ
+
+
 def config_logging():
-    if 'alfred_debug' in os.environ:
+    if is_debugging():
         level = logging.DEBUG
     else:
         level = logging.CRITICAL
@@ -72,6 +155,47 @@ def config_logging():
         format='%(levelname)s:%(name)s -> %(message)s', level=level)
 
 
+def spawn(cmd: ty.List[str], **kwargs) -> subprocess.Popen:
+    """
+    Same as ``subprocess.Popen``, but without closing the file descriptors
+    inherited from this process, which would cost a syscall per descriptor
+    on systems without ``close_range``. File descriptors opened by Python are
+    non-inheritable by default (PEP 446), so nothing unintended leaks into
+    the child.
+    """
+    return subprocess.Popen(cmd, close_fds=False, **kwargs)
+
+
+def run(cmd: ty.List[str], **kwargs) -> subprocess.CompletedProcess:
+    """
+    Same as ``subprocess.run``, but without closing inherited file
+    descriptors, like :func:`spawn`.
+    """
+    return subprocess.run(cmd, close_fds=False, **kwargs)
+
+
+def form_ssh_cmdline(host: str) -> ty.List[str]:
+    """
+    Connections to the same host are multiplexed over one master connection
+    that lingers for ten minutes, so that only the first call pays for the
+    SSH handshake. The control socket lives under the temp directory since
+    the Alfred cache directory may exceed the length limit of socket paths.
+    """
+    import tempfile
+
+    control_path = Path(tempfile.gettempdir()) / 'say-%C'
+    return [
+        'ssh',
+        '-o',
+        'ControlMaster=auto',
+        '-o',
+        f'ControlPath={control_path}',
+        '-o',
+        'ControlPersist=600',
+        host,
+    ]
+
+
 def form_tts_cmdline(
     host: ty.Optional[str],
     tts_bin: Path,
@@ -79,7 +203,7 @@ def form_tts_cmdline(
 ) -> ty.List[str]:
     cmd = []
     if host:
-        cmd.extend(['ssh', host])
+        cmd.extend(form_ssh_cmdline(host))
     cmd.append(str(tts_bin))
     cmd.extend(argv)
     return cmd
@@ -88,28 +212,91 @@ def form_tts_cmdline(
 def form_bash_cmdline(host: ty.Optional[str],) -> ty.List[str]:
     cmd = []
     if host:
-        cmd.extend(['ssh', host])
+        cmd.extend(form_ssh_cmdline(host))
     cmd.append('bash')
     return cmd
 
 
-def list_model_names(host: ty.Optional[str], tts_bin: Path):
+def form_models_cache_key(host: ty.Optional[str], tts_bin: Path) -> str:
+    return f'{host or "localhost"}:{tts_bin}'
+
+
+def load_models_cache(cachedir: Path) -> ty.Dict[str, ty.Any]:
+    try:
+        with open(cachedir / 'models.json', 'rb') as infile:
+            return json_loads(infile.read())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def mark_model_installed(
+    host: ty.Optional[str],
+    tts_bin: Path,
+    cachedir: Path,
+    model: str,
+):
+    """
+    Mark ``model`` as installed in the cached model list of ``host`` if it's
+    listed there as not installed, since ``tts`` has just downloaded it.
+    """
+    logger = logging.getLogger('mark_model_installed')
+    try:
+        with open(cachedir / 'models.json', 'rb') as infile:
+            data = infile.read()
+    except FileNotFoundError:
+        return
+    # The cache is written by json_dumps as well, so this spares parsing it in
+    # the common case where the model is already marked installed.
+    if json_dumps([model, False]) not in data:
+        return
+    cache_key = form_models_cache_key(host, tts_bin)
+    all_models = load_models_cache(cachedir)
+    cached = all_models.get(cache_key)
+    if not cached:
+        return
+    for entry in cached['models']:
+        if entry == [model, False]:
+            entry[1] = True
+            write_atomic(cachedir / 'models.json', json_dumps(all_models))
+            logger.debug('Marked %s installed for %s', model, cache_key)
+            break
+
+
+def list_model_names(
+    host: ty.Optional[str],
+    tts_bin: Path,
+    cachedir: Path,
+    force_refresh: bool = False,
+):
+    import time
+
     logger = logging.getLogger('list_model_names')
-    cmd = form_tts_cmdline(host, tts_bin, ['--list_models'])
-    models = []
-    with subprocess.Popen(
-            cmd, text=True, stdout=subprocess.PIPE, encoding='utf-8') as proc:
-        logger.debug('Command issued: %s', ' '.join(cmd))
-        logger.info('Process PID: %d', proc.pid)
-        for line in proc.stdout:
-            line = line.strip()
-            logger.debug('Read line: %r', line)
-            matchobj = re.match(
-                r'\d+: *(tts_models/[-/\w]+)( *\[already downloaded])?', line)
-            if matchobj:
-                models.append((matchobj.group(1), bool(matchobj.group(2))))
-                logger.debug('Added model: %s (installed: %s)',
-                             matchobj.group(1), bool(matchobj.group(2)))
+    cache_key = form_models_cache_key(host, tts_bin)
+    all_models = load_models_cache(cachedir)
+    cached = all_models.get(cache_key)
+    if (not force_refresh and cached
+            and time.time() - cached['updated'] < MODELS_CACHE_TTL):
+        logger.debug('Using cached model list for %s', cache_key)
+        models = cached['models']
+    else:
+        cmd = form_tts_cmdline(host, tts_bin, ['--list_models'])
+        models = []
+        with spawn(
+                cmd, text=True, stdout=subprocess.PIPE,
+                encoding='utf-8') as proc:
+            logger.debug('Command issued: %s', ' '.join(cmd))
+            logger.info('Process PID: %d', proc.pid)
+            out, _ = proc.communicate()
+            logger.debug('Read output: %r', out)
+            retcode = proc.returncode
+        for matchobj in MODEL_PATTERN.finditer(out):
+            name = matchobj.group(1)
+            installed = bool(matchobj.group(2))
+            models.append((name, installed))
+            logger.debug('Added model: %s (installed: %s)', name, installed)
+        if retcode == 0 and models:
+            all_models[cache_key] = {'updated': time.time(), 'models': models}
+            write_atomic(cachedir / 'models.json', json_dumps(all_models))
     resp = {'items': []}
     for name, installed in models:
         _, lang, dataset, basename = name.split('/')
@@ -121,77 +308,167 @@ def list_model_names(host: ty.Optional[str], tts_bin: Path):
             'arg': name,
             'match': name.replace('/', ' '),
         })
-    print(json.dumps(resp), end='')
+    emit(resp)
+
+
+def is_single_speaker_model(model: str) -> bool:
+    """
+    :param model: the model name, e.g. ``tts_models/en/ljspeech/vits``
+    :return: ``True`` if the model is known to be trained on a single-speaker
+             dataset, so that there's no need to query its speakers
+    """
+    parts = model.split('/')
+    return len(parts) == 4 and parts[2] in SINGLE_SPEAKER_DATASETS
+
+
+def query_speakers(
+    host: ty.Optional[str],
+    tts_bin: Path,
+    model: str,
+) -> ty.Optional[ty.List[str]]:
+    """
+    :return: the speakers of ``model``, or ``None`` if ``tts`` doesn't list
+             any
+    """
+    logger = logging.getLogger('query_speakers')
+    speakers = None
+    cmd = form_tts_cmdline(host, tts_bin, [
+        '--model_name', model, '--list_speaker_idxs', '--progress_bar', 'false'
+    ])
+    with spawn(
+            cmd,
+            text=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            encoding='utf-8') as proc:
+        logger.info('Process PID: %d', proc.pid)
+        logger.debug('Command issued: %s', ' '.join(cmd))
+        for line in proc.stdout:
+            line = line.strip()
+            logger.debug('Read line: %r', line)
+            if line.startswith('dict_keys(['):
+                speakers = [m[1] for m in SPEAKER_PATTERN.findall(line)]
+                break
+            if 'I agree to the terms' in line:
+                proc.stdin.write('y\n')
+                proc.stdin.flush()
+        proc.stdin.close()
+        proc.wait()
+    return speakers
+
+
+def form_speakers_resp(speakers: ty.Optional[ty.List[str]]):
+    logger = logging.getLogger('form_speakers_resp')
+    if speakers:
+        return {'items': [{'title': x, 'arg': x} for x in speakers]}
+    logger.warning('speakers not set')
+    return {
+        'items': [{
+            'title': 'default speaker',
+            'arg': '',
+        }],
+    }
 
 
 def list_speakers(host: ty.Optional[str], tts_bin: Path, cachedir: Path):
+    import hashlib
+
     logger = logging.getLogger('list_speakers')
     model = os.environ['model']
+    if is_single_speaker_model(model):
+        logger.debug('Skipped querying speakers of %s', model)
+        emit(form_speakers_resp(None))
+        return
+    # The response itself is cached, one file per model, so that a cache hit
+    # involves no JSON processing at all.
+    model_hash = hashlib.md5(
+        model.encode('utf-8'), usedforsecurity=False).hexdigest()
+    cache_file = cachedir / f'speakers-{model_hash}.json'
     try:
-        with open(cachedir / 'speakers.json', encoding='utf-8') as infile:
-            all_speakers = json.load(infile)
+        with open(cache_file, 'rb') as infile:
+            data = infile.read()
     except FileNotFoundError:
-        all_speakers = {}
-    speakers = all_speakers.get(model, [])
-    if speakers is not None and not speakers:
-        cmd = form_tts_cmdline(host, tts_bin, [
-            '--model_name', model, '--list_speaker_idxs', '--progress_bar',
-            'false'
-        ])
-        with subprocess.Popen(
-                cmd,
-                text=True,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                encoding='utf-8') as proc:
-            logger.info('Process PID: %d', proc.pid)
-            logger.debug('Command issued: %s', ' '.join(cmd))
-            for line in proc.stdout:
-                line = line.strip()
-                logger.debug('Read line: %r', line)
-                if line.startswith('dict_keys(['):
-                    line = line[len('dict_keys(['):-len('])')]
-                    speakers = [x[1:-1] for x in line.split(', ')]
-                    break
-                if 'I agree to the terms' in line:
-                    proc.stdin.write('y\n')
-                    proc.stdin.flush()
-            else:
-                speakers = None
-            proc.stdin.close()
-            retcode = proc.wait()
-        all_speakers[model] = speakers
-        with open(
-                cachedir / 'speakers.json', 'w', encoding='utf-8') as outfile:
-            json.dump(all_speakers, outfile)
-    if speakers:
-        resp = {'items': [{'title': x, 'arg': x} for x in speakers]}
-    else:
-        logger.warning('speakers not set')
-        resp = {
-            'items': [{
-                'title': 'default speaker',
-                'arg': '',
-            }],
-        }
-    print(json.dumps(resp), end='')
+        data = None
+    if data is None:
+        speakers = query_speakers(host, tts_bin, model)
+        data = json_dumps(form_speakers_resp(speakers))
+        write_atomic(cache_file, data)
+        # Superseded by the per-model caches.
+        (cachedir / 'speakers.json').unlink(missing_ok=True)
+    sys.stdout.buffer.write(data)
 
 
 def save_cfg(datadir: Path):
     model = os.environ['model']
     speaker = os.environ['speaker'] or None
-    with open(datadir / 'config.json', 'w', encoding='utf-8') as outfile:
-        json.dump({'model': model, 'speaker': speaker}, outfile)
+    write_atomic(datadir / 'config.json',
+                 json_dumps({'model': model, 'speaker': speaker}))
+    if not export_cfg(model, speaker):
+        # Otherwise, 'says' would silently keep using the variables exported
+        # previously.
+        applescript = ('display notification '
+                       '"\'says\' may still use the previous config. '
+                       'Open Alfred debug panel to debug." '
+                       'with title "Failed to Save Config!"')
+        run(['osascript', '-e', applescript])
+        sys.exit(1)
 
 
-def check_cfg(datadir: Path):
+def export_cfg(model: str, speaker: ty.Optional[str]) -> bool:
+    """
+    Store the config as workflow variables ``model`` and ``speaker`` as well,
+    so that ``says`` finds it in its environment without reading
+    ``config.json``.
+
+    :return: ``True`` on success
+    """
+    logger = logging.getLogger('export_cfg')
+    bundleid = os.getenv('alfred_workflow_bundleid')
+    if not bundleid:
+        logger.error('alfred_workflow_bundleid not set; config not exported')
+        return False
+    applescript = '''\
+on run argv
+    set {theModel, theSpeaker, theBundleId} to argv
+    tell application id "com.runningwithcrayons.Alfred"
+        set configuration "model" to value theModel ¬
+            in workflow theBundleId without exportable
+        set configuration "speaker" to value theSpeaker ¬
+            in workflow theBundleId without exportable
+    end tell
+end run'''
+    cmd = ['osascript', '-e', applescript, model, speaker or '', bundleid]
+    logger.debug('Command issued: %s', ' '.join(cmd))
     try:
-        with open(datadir / 'config.json', encoding='utf-8') as infile:
-            cfg = json.load(infile)
-    except FileNotFoundError:
-        cfg = {}
-    model = cfg.get('model', '<default model>')
+        run(cmd, check=True)
+    except subprocess.CalledProcessError as err:
+        logger.error('Call to osascript failed with err: %s', err)
+        return False
+    return True
+
+
+def load_cfg(datadir: Path) -> ty.Dict[str, ty.Optional[str]]:
+    """
+    :return: the config, taken from variables ``model`` and ``speaker`` if
+             set (see :func:`export_cfg`), otherwise from ``config.json``
+    """
+    if 'model' in os.environ:
+        return {
+            'model': os.environ['model'],
+            'speaker': os.getenv('speaker') or None,
+        }
+    try:
+        with open(datadir / 'config.json', 'rb') as infile:
+            return json_loads(infile.read())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def check_cfg(datadir: Path):
+    # Same source as 'says', so that the two never disagree.
+    cfg = load_cfg(datadir)
+    model = cfg.get('model') or '<default model>'
     speaker = cfg.get('speaker', '<default speaker>') or '<default speaker>'
     resp = {
         'items': [
@@ -211,7 +488,162 @@ def check_cfg(datadir: Path):
             },
         ]
     }
-    print(json.dumps(resp), end='')
+    emit(resp)
+
+
+def use_mpg123() -> bool:
+    """
+    :return: ``True`` if the result is to be played with ``mpg123``, rather
+             than QuickTime Player
+    """
+    import shutil
+
+    return bool(shutil.which('mpg123'))
+
+
+def open_wav_sink(
+    stack: contextlib.ExitStack,
+    output: Path,
+    ffmpeg_cmd: ty.Optional[ty.List[str]],
+    stderr: int,
+) -> ty.Tuple[ty.Optional[subprocess.Popen], ty.BinaryIO]:
+    """
+    :param stack: where to register the opened resources
+    :param output: the wav file to write
+    :param ffmpeg_cmd: the ``ffmpeg`` command reading the wav from stdin and
+           writing ``output``, or ``None`` to write ``output`` directly
+    :param stderr: where to redirect stderr of ``ffmpeg_cmd``
+    :return: the ``ffmpeg`` process if any, and the file to write the wav to
+    """
+    logger = logging.getLogger('open_wav_sink')
+    if not ffmpeg_cmd:
+        return None, stack.enter_context(open(output, 'wb'))
+    ffmpeg = stack.enter_context(
+        spawn(
+            ffmpeg_cmd,
+            bufsize=0,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr))
+    logger.debug('Command issued: %s', ' '.join(ffmpeg_cmd))
+    return ffmpeg, ffmpeg.stdin
+
+
+def wait_ffmpeg(ffmpeg: ty.Optional[subprocess.Popen]) -> int:
+    """
+    :param ffmpeg: the ``ffmpeg`` process returned by :func:`open_wav_sink`,
+           whose stdin has been closed
+    :return: the return code of ``ffmpeg``, or zero if there's no ``ffmpeg``
+    """
+    logger = logging.getLogger('wait_ffmpeg')
+    if not ffmpeg:
+        return 0
+    if ffmpeg.stderr:
+        for line in ffmpeg.stderr:
+            logger.debug('Read line (ffmpeg stderr): %r',
+                         line.decode('utf-8').strip())
+    retcode = ffmpeg.wait()
+    if retcode != 0:
+        logger.error('Call to ffmpeg returns nonzero %d', retcode)
+    return retcode
+
+
+def synthesize(
+    cmd: ty.List[str],
+    script: ty.Optional[str],
+    output: Path,
+    ffmpeg_cmd: ty.Optional[ty.List[str]],
+    stderr: int,
+) -> int:
+    """
+    Write the wav written by ``cmd`` to stdout into ``output``, through
+    ``ffmpeg_cmd`` if given.
+
+    :param cmd: the command that runs ``tts``
+    :param script: the script to feed to ``cmd`` via stdin, if any
+    :param output: the wav file to write
+    :param ffmpeg_cmd: the ``ffmpeg`` command reading the wav from stdin
+    :param stderr: where to redirect stderr of the processes
+    :return: the return code of ``cmd``, or that of ``ffmpeg_cmd`` if the
+             former is zero
+    """
+    logger = logging.getLogger('synthesize')
+    with contextlib.ExitStack() as stack:
+        ffmpeg, sink = open_wav_sink(stack, output, ffmpeg_cmd, stderr)
+        with spawn(
+                cmd,
+                stdin=subprocess.PIPE if script else subprocess.DEVNULL,
+                stdout=sink,
+                stderr=stderr) as proc:
+            logger.info('Process PID: %d', proc.pid)
+            # Let tts be the only writer of the sink.
+            sink.close()
+            if script:
+                proc.stdin.write(script.encode('utf-8'))
+                proc.stdin.close()
+                logger.debug('Command issued: %s', script)
+            else:
+                logger.debug('Command issued: %s', ' '.join(cmd))
+            if proc.stderr:
+                for line in proc.stderr:
+                    logger.debug('Read line (stderr): %r',
+                                 line.decode('utf-8').strip())
+            logger.info('Waiting for process to complete')
+            retcode = proc.wait()
+        ffmpeg_retcode = wait_ffmpeg(ffmpeg)
+    return retcode or ffmpeg_retcode
+
+
+def synthesize_with_server(
+    url: str,
+    params: ty.Dict[str, str],
+    timeout: float,
+    output: Path,
+    ffmpeg_cmd: ty.Optional[ty.List[str]],
+    stderr: int,
+) -> int:
+    """
+    Request ``tts-server`` at ``url`` for the wav and write it into
+    ``output``, through ``ffmpeg_cmd`` if given.
+
+    :param url: the base url of ``tts-server``
+    :param params: the query parameters of ``/api/tts``
+    :param timeout: seconds to wait for the server to respond before giving
+           up, applied to connecting and to each read
+    :param output: the wav file to write
+    :param ffmpeg_cmd: the ``ffmpeg`` command reading the wav from stdin
+    :param stderr: where to redirect stderr of ``ffmpeg_cmd``
+    :return: zero on success
+    """
+    import shutil
+    import urllib.parse
+    import urllib.request
+
+    logger = logging.getLogger('synthesize_with_server')
+    request_url = (f'{url.rstrip("/")}/api/tts?'
+                   f'{urllib.parse.urlencode(params)}')
+    logger.debug('Requesting: %s', request_url)
+    with contextlib.ExitStack() as stack:
+        ffmpeg, sink = open_wav_sink(stack, output, ffmpeg_cmd, stderr)
+        try:
+            with urllib.request.urlopen(request_url, timeout=timeout) as resp:
+                shutil.copyfileobj(resp, sink, 1 << 20)
+                # Bytes still expected by Content-Length, if the server
+                # closes the connection early.
+                missing = resp.length
+        except OSError as err:
+            logger.error('Failed to receive speech from tts-server: %s', err)
+            retcode = 1
+        else:
+            if missing:
+                logger.error('Response from tts-server is truncated (%d '
+                             'bytes missing)', missing)
+                retcode = 1
+            else:
+                retcode = 0
+        sink.close()
+        ffmpeg_retcode = wait_ffmpeg(ffmpeg)
+    return retcode or ffmpeg_retcode
 
 
 def says(
@@ -224,11 +656,9 @@ def says(
 ):
     logger = logging.getLogger('says')
     logger.debug('Received message %r', message)
-    try:
-        with open(datadir / 'config.json', encoding='utf-8') as infile:
-            cfg = json.load(infile)
-    except FileNotFoundError:
-        cfg = {}
+    # Outside debugging, stderr would be read only to be discarded.
+    stderr = subprocess.PIPE if is_debugging() else subprocess.DEVNULL
+    cfg = load_cfg(datadir)
     model = cfg.get('model', None)
     speaker = cfg.get('speaker', None)
     lang = os.getenv('lang')
@@ -249,7 +679,51 @@ def says(
         tts_cmd.extend(['--speaker_idx', speaker])
     if lang:
         tts_cmd.extend(['--language_idx', lang])
-    cmdline = f'''\
+
+    output = cachedir / 'speech.wav'
+    output_mp3 = output.with_suffix('.mp3')
+    if use_mpg123():
+        # mpg123 plays only mp3. Transcode while receiving the wav, so that the
+        # player needn't read back and convert the wav afterwards.
+        ffmpeg_cmd = [
+            'ffmpeg',
+            '-y',
+            '-nostats',
+            '-loglevel',
+            'error',
+            '-i',
+            'pipe:0',
+            '-c:a',
+            'copy',
+            str(output),
+            str(output_mp3),
+        ]
+    else:
+        # QuickTime Player plays the wav as is.
+        ffmpeg_cmd = None
+    tts_server_url = os.getenv('tts_server_url')
+    if tts_server_url:
+        # The model is the one the server is started with.
+        params = {
+            'text': message,
+            'speaker_id': speaker or '',
+            'style_wav': '',
+            'language_id': lang or '',
+        }
+        try:
+            timeout = float(
+                os.getenv('tts_server_timeout') or TTS_SERVER_TIMEOUT)
+        except ValueError:
+            logger.warning('Invalid tts_server_timeout %r; using %d seconds',
+                           os.environ['tts_server_timeout'],
+                           TTS_SERVER_TIMEOUT)
+            timeout = TTS_SERVER_TIMEOUT
+        retcode = synthesize_with_server(tts_server_url, params, timeout,
+                                         output, ffmpeg_cmd, stderr)
+    elif host:
+        import shlex
+
+        cmdline = f'''\
 if [ -f {tmp_output} ]; then
     echo {tmp_output} already exists >&2
     exit 1
@@ -259,33 +733,35 @@ retcode=$?
 rm -f {tmp_output}
 exit $retcode
 '''
-
-    output = cachedir / 'speech.wav'
-    with subprocess.Popen(
-            form_bash_cmdline(host),
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE) as proc:
-        logger.info('Process PID: %d', proc.pid)
-        proc.stdin.write(cmdline.encode('utf-8'))
-        proc.stdin.close()
-        logger.debug('Command issued: %s', cmdline)
-        with open(output, 'wb') as outfile:
-            shutil.copyfileobj(proc.stdout, outfile)
-        for line in proc.stderr:
-            logger.debug('Read line (stderr): %r',
-                         line.decode('utf-8').strip())
-        logger.info('Waiting for process to complete')
-        retcode = proc.wait()
-        if retcode != 0:
-            output.unlink()
-            logger.error('Returns nonzero %d; unlinked the output', retcode)
+        retcode = synthesize(
+            form_bash_cmdline(host), cmdline, output, ffmpeg_cmd, stderr)
+    elif os.path.exists(tmp_output):
+        logger.error('%s already exists', tmp_output)
+        retcode = 1
+    else:
+        # Run tts directly, sparing the bash process.
+        try:
+            retcode = synthesize(tts_cmd, None, output, ffmpeg_cmd, stderr)
+        finally:
+            Path(tmp_output).unlink(missing_ok=True)
+    if retcode != 0:
+        output.unlink(missing_ok=True)
+        output_mp3.unlink(missing_ok=True)
+        logger.error('Returns nonzero %d; unlinked the output', retcode)
+    elif ffmpeg_cmd:
+        # Make sure the mp3 is not considered outdated by the player.
+        os.utime(output_mp3)
+    else:
+        # Left from previous runs; converted again if needed by the player.
+        output_mp3.unlink(missing_ok=True)
     if retcode == 0:
+        if model and not tts_server_url:
+            mark_model_installed(host, tts_bin, cachedir, model)
         applescript = ('display notification '
                        '"Listen with Alfred keyword \'sayagain\'" '
                        'with title "TTS Processing Complete!" '
                        'sound name "Blow"')
-        subprocess.run(['osascript', '-e', applescript])
+        run(['osascript', '-e', applescript])
     if retcode == 0:
         resp = {
             'items': [
@@ -306,28 +782,48 @@ exit $retcode
                 },
             ]
         }
-    print(json.dumps(resp), end='')
-
-
-def enqueue_output(out: ty.BinaryIO, q: queue.Queue):
-    """See https://stackoverflow.com/a/4896288/7881370."""
-    for line in iter(out.readline, b''):
-        q.put(line)
-    out.close()
+    emit(resp)
 
 
-def speak_result_qtplayer():
-    logger = logging.getLogger('speak_result_qtplayer')
-    result_wav = Path(os.environ['result_wav'])
-    logger.debug('Received result_wav as: %s', result_wav)
+def convert_to_mp3(result_wav: Path) -> ty.Optional[Path]:
+    """
+    :param result_wav: the wav file to convert
+    :return: the converted mp3 file, or ``None`` if the conversion failed
+    """
+    logger = logging.getLogger('convert_to_mp3')
     result_mp3 = result_wav.with_suffix('.mp3')
+    try:
+        if result_mp3.stat().st_mtime >= result_wav.stat().st_mtime:
+            logger.debug('Reusing up-to-date %s', result_mp3)
+            return result_mp3
+    except FileNotFoundError:
+        pass
     cmd = ['ffmpeg', '-y', '-i', str(result_wav), str(result_mp3)]
     logger.debug('Command issued: %s', ' '.join(cmd))
     try:
-        subprocess.run(cmd, check=True)
+        run(cmd, check=True)
     except subprocess.CalledProcessError as err:
         logger.error('Call to ffmpeg failed with err: %s', err)
-        return
+        return None
+    return result_mp3
+
+
+class Playback(enum.Enum):
+    PLAYED = enum.auto()
+    # QuickTime Player refused to play the audio.
+    FAILED = enum.auto()
+    # QuickTime Player didn't respond in time, e.g. on a cold launch.
+    TIMED_OUT = enum.auto()
+
+
+def play_with_qtplayer(audio: Path) -> Playback:
+    """
+    :param audio: the audio file to play
+    :return: how the playback went
+    """
+    import selectors
+
+    logger = logging.getLogger('play_with_qtplayer')
     applescript = '''\
 on run argv
     set theFile to the first item of argv
@@ -344,50 +840,59 @@ on run argv
         quit
     end tell
 end run'''
-    cmd = ['osascript']
-    for line in applescript.split('\n'):
-        cmd.extend(['-e', line.strip()])
-    cmd.append(str(result_mp3))
+    cmd = ['osascript', '-e', applescript, str(audio)]
     logger.debug('Command issued: %s', ' '.join(cmd))
-    with subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True) as proc:
-        # See https://stackoverflow.com/a/4896288/7881370.
-        q = queue.Queue()
-        t = threading.Thread(
-            target=enqueue_output, args=(proc.stderr, q), daemon=True)
-        t.start()
-        try:
-            _line = q.get(timeout=5)
-        except queue.Empty:
+    with spawn(cmd, stderr=subprocess.PIPE) as proc, \
+            selectors.DefaultSelector() as sel:
+        sel.register(proc.stderr, selectors.EVENT_READ)
+        if sel.select(timeout=5):
+            # Won't block since the pipe is readable.
+            log = os.read(proc.stderr.fileno(), 4096)
+            logger.debug('Read (stderr): %r', log)
+        else:
             # Doesn't receive the log message. QuickTime Player is not launched
             # correctly.
             proc.terminate()
             proc.wait()
             logger.error('QuickTime Player is not launched correctly')
-            return
+            return Playback.TIMED_OUT
         retcode = proc.wait()
         if retcode != 0:
             logger.error(
                 'Call to osascript (QuickTime Player) returns nonzero: %d',
                 retcode)
-            return
+            # Otherwise, the audio has been played already.
+            if b'QuickTimer Player started' not in log:
+                return Playback.FAILED
+    return Playback.PLAYED
+
+
+def speak_result_qtplayer():
+    logger = logging.getLogger('speak_result_qtplayer')
+    result_wav = Path(os.environ['result_wav'])
+    logger.debug('Received result_wav as: %s', result_wav)
+    # QuickTime Player plays wav itself on recent macOS.
+    if play_with_qtplayer(result_wav) != Playback.FAILED:
+        return
+    logger.warning('QuickTime Player refused to play %s; falling back to mp3',
+                   result_wav)
+    result_mp3 = convert_to_mp3(result_wav)
+    if not result_mp3:
+        return
+    play_with_qtplayer(result_mp3)
 
 
 def speak_result_mpg123():
     logger = logging.getLogger('speak_result_mpg123')
     result_wav = Path(os.environ['result_wav'])
     logger.debug('Received result_wav as: %s', result_wav)
-    result_mp3 = result_wav.with_suffix('.mp3')
-    cmd = ['ffmpeg', '-y', '-i', str(result_wav), str(result_mp3)]
-    logger.debug('Command issued: %s', ' '.join(cmd))
-    try:
-        subprocess.run(cmd, check=True)
-    except subprocess.CalledProcessError as err:
-        logger.error('Call to ffmpeg failed with err: %s', err)
+    result_mp3 = convert_to_mp3(result_wav)
+    if not result_mp3:
         return
     cmd = ['mpg123', str(result_mp3)]
     logger.debug('Command issued: %s', ' '.join(cmd))
     try:
-        subprocess.run(
+        run(
             cmd,
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
@@ -398,12 +903,18 @@ def speak_result_mpg123():
 
 
 def main():
-    args = make_parser().parse_args()
+    # Dispatch 'says' without constructing the argument parser, since it's
+    # the most latency-sensitive subcommand.
+    if len(sys.argv) == 3 and sys.argv[1] == 'says':
+        args = types.SimpleNamespace(func='says', message=sys.argv[2])
+    else:
+        args = make_parser().parse_args()
     config_logging()
     if args.func == 'list-models':
         host = get_host()
         tts = get_tts()
-        list_model_names(host, tts)
+        cachedir = get_cachedir()
+        list_model_names(host, tts, cachedir, args.force_refresh)
     elif args.func == 'list-speakers':
         host = get_host()
         tts = get_tts()
@@ -423,7 +934,7 @@ def main():
         cachedir = get_cachedir()
         says(host, tts, device, datadir, cachedir, args.message)
     elif args.func == 'play-result':
-        if shutil.which('mpg123'):
+        if use_mpg123():
             speak_result_mpg123()
         else:
             speak_result_qtplayer()